@@ -1,15 +1,19 @@
+import io
 import re
+from collections import Counter
 
 import streamlit as st
 import pandas as pd
 import plotly.express as px
 import plotly.io as pio
-import matplotlib.pyplot as plt
-from wordcloud import WordCloud
 from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
 
 pio.templates.default = 'plotly_white'
 
+MAX_PLOT_ROWS = 5000
+STRESS_LEVELS = pd.CategoricalDtype(['Low', 'Moderate', 'High', 'Severe'], ordered=True)
+NON_ALPHA = re.compile(r'[^a-z\s]')
+
 st.set_page_config(
     page_title="Student Stress Dashboard",
     page_icon="😩",
@@ -17,31 +21,57 @@ st.set_page_config(
 )
 
 
+@st.cache_data
 def load_data():
-    campaign = pd.read_csv("data/Mental_Health_Campaign_News_Dataset.csv")
-    session = pd.read_csv("data/Counseling_Center_Statistics_Dataset.csv")
-    stress = pd.read_csv("data/Student_Stress_Survey_Dataset.csv")
-
-    campaign["Year"] = pd.to_datetime(campaign["Date"], errors="coerce").dt.year
-    session["Year"] = session["Year"].astype(int)
+    campaign = pd.read_csv(
+        "data/Mental_Health_Campaign_News_Dataset.csv",
+        engine="pyarrow",
+        usecols=["University", "Date", "Headline"],
+        dtype={"University": "category", "Date": "string"},
+    )
+    session = pd.read_csv(
+        "data/Counseling_Center_Statistics_Dataset.csv",
+        engine="pyarrow",
+        usecols=["University", "Year", "Sessions_Held", "Students_Served"],
+        dtype={"University": "category", "Year": "int16"},
+    )
+    stress = pd.read_csv(
+        "data/Student_Stress_Survey_Dataset.csv",
+        engine="pyarrow",
+        usecols=["University", "Gender", "Stress_Level", "Primary_Stress_Factor"],
+        dtype={
+            "University": "category",
+            "Gender": "category",
+            "Stress_Level": "category",
+            "Primary_Stress_Factor": "category",
+        },
+    )
 
-    if "Stress_Level" in stress.columns:
-        stress["Stress_Level"] = stress["Stress_Level"].astype(str)
-    if "Gender" in stress.columns:
-        stress = stress[stress["Gender"].isin(["Male", "Female"])]
+    campaign["Year"] = pd.to_numeric(campaign["Date"].str.slice(0, 4), errors="coerce").astype("Int16")
+    stress = stress[stress["Gender"].isin(["Male", "Female"])]
 
     return campaign, session, stress
 
 
-campaign_df_all, session_df_all, stress_df_all = load_data()
+@st.cache_data
+def filter_data(selected):
+    campaign, session, stress = load_data()
+    return (
+        campaign[campaign["University"].isin(selected)],
+        session[session["University"].isin(selected)],
+        stress[stress["University"].isin(selected)],
+    )
+
+
+@st.cache_data
+def university_options():
+    _, session, _ = load_data()
+    return list(session["University"].cat.categories)
+
 
 with st.sidebar:
     st.title("Student Stress Dashboard")
-    session_df = session_df_all.copy()
-    campaign_df = campaign_df_all.copy()
-    stress_df = stress_df_all.copy()
-
-    universities = sorted(session_df["University"].unique())
+    universities = university_options()
     c1, c2 = st.columns(2)
     with c1:
         if st.button("Select All", use_container_width=True):
@@ -56,20 +86,25 @@ with st.sidebar:
         uni for uni in universities
         if st.checkbox(uni, key=uni, value=st.session_state.get(uni, True))
     ]
-    session_df = session_df[session_df["University"].isin(selected)]
-    stress_df = stress_df[stress_df["University"].isin(selected)]
-    campaign_df = campaign_df[campaign_df["University"].isin(selected)]
+    campaign_df, session_df, stress_df = filter_data(tuple(selected))
 
 
 def sessions_held_area_chart(df):
-    summary = df.groupby(['Year', 'University'], as_index=False)['Sessions_Held'].sum()
+    summary = df.groupby(['Year', 'University'], as_index=False, observed=True)['Sessions_Held'].sum()
     fig = px.area(summary, x='Year', y='Sessions_Held', color='University', title='Sessions Held by Year')
     fig.for_each_trace(lambda trace: trace.update(fillcolor=trace.line.color))
     st.plotly_chart(fig)
 
 
-def stress_factors_stacked_bar_chart(df):
-    counts = df.groupby(['University', 'Primary_Stress_Factor']).size().reset_index(name='count')
+def stress_factor_counts(df):
+    return (
+        df.groupby(['University', 'Primary_Stress_Factor', 'Stress_Level'], observed=True, dropna=False)
+        .size().reset_index(name='count')
+    )
+
+
+def stress_factors_stacked_bar_chart(factor_counts):
+    counts = factor_counts.groupby(['University', 'Primary_Stress_Factor'], as_index=False, observed=True)['count'].sum()
     fig = px.bar(
         counts, x='count', y='University', color='Primary_Stress_Factor', orientation='h',
         barmode='stack', title='Primary Stress Factors by University'
@@ -78,90 +113,118 @@ def stress_factors_stacked_bar_chart(df):
 
 
 def gender_dist_pie_chart(df):
-    counts = df['Gender'].value_counts().reset_index()
+    counts = df['Gender'].value_counts().loc[lambda s: s > 0].reset_index()
     counts.columns = ['Gender', 'count']
     fig = px.pie(counts, names='Gender', values='count', title='Gender Distribution')
     fig.update_traces(textposition='inside', textinfo='percent+label', showlegend=False)
     st.plotly_chart(fig)
 
 
+def sample_per_group(df, by, n=MAX_PLOT_ROWS):
+    if len(df) <= n:
+        return df
+    return df.groupby(by, observed=True).sample(frac=n / len(df), random_state=0)
+
+
 def gender_stress_box_plot(df):
-    mapping = {'Low': 1, 'Moderate': 2, 'High': 3, 'Severe': 4}
-    df2 = df[df['Stress_Level'].isin(mapping)].copy()
-    df2['Stress_Num'] = df2['Stress_Level'].map(mapping)
+    levels = df['Stress_Level'].cat.set_categories(STRESS_LEVELS.categories, ordered=True).cat.codes
+    df2 = df[levels >= 0].copy()
+    df2['Stress_Num'] = levels[levels >= 0] + 1
+    df2 = sample_per_group(df2, 'Gender')
     fig = px.box(df2, x='Gender', y='Stress_Num', color='Gender', title='Stress Level Distribution by Gender')
     st.plotly_chart(fig)
 
 
-def university_students_bar_chart(df):
-    counts = df['University'].value_counts().reset_index()
-    counts.columns = ['University', 'count']
+def university_students_bar_chart(factor_counts):
+    counts = (
+        factor_counts.groupby('University', as_index=False, observed=True)['count'].sum()
+        .sort_values('count', ascending=False, kind='stable')
+    )
     fig = px.bar(counts, x='count', y='University', text='count', orientation='h', title='Students per University')
     fig.update_traces(textposition='outside')
     st.plotly_chart(fig)
 
 
-def preprocess_wordcloud(text):
-    stopwords = set(ENGLISH_STOP_WORDS)
-    text = text.lower()
-    text = re.sub(r'[^a-z\s]', '', text)
-    tokens = [w for w in text.split() if w not in stopwords and len(w) > 1]
-    return tokens
+@st.cache_data
+def headline_frequencies_by_university():
+    from wordcloud import STOPWORDS
 
+    campaign, _, _ = load_data()
+    tokens = (
+        campaign.set_index('University')['Headline'].dropna().str.lower()
+        .str.replace(NON_ALPHA, '', regex=True)
+        .str.split().explode()
+    )
+    tokens = tokens[~tokens.isin(ENGLISH_STOP_WORDS | STOPWORDS) & (tokens.str.len() > 1)]
+    counts = tokens.groupby(level=0, observed=True).value_counts()
+    return {
+        uni: Counter(group.droplevel(0).to_dict())
+        for uni, group in counts.groupby(level=0, observed=True)
+    }
 
 
-def draw_headline_wordcloud(df):
-    texts = df['Headline'].dropna().astype(str)
-    stopwords = set(ENGLISH_STOP_WORDS)
+def merge_plurals(freqs):
+    merged = Counter(freqs)
+    for word in list(merged):
+        if word.endswith('s') and not word.endswith('ss') and word[:-1] in merged:
+            merged[word[:-1]] += merged.pop(word)
+    return merged
 
-    def preprocess(text):
-        text = text.lower()
-        text = re.sub(r'[^a-z\s]', '', text)
-        tokens = [w for w in text.split() if w not in stopwords and len(w) > 1]
-        return tokens
 
-    all_tokens = []
-    for t in texts:
-        all_tokens.extend(preprocess(t))
+@st.cache_data
+def headline_wordcloud_png(freqs):
+    from wordcloud import WordCloud
 
-    wc = WordCloud(width=2000, height=1200, background_color='#F7F9FA', collocations=False).generate(' '.join(all_tokens))
-    fig, ax = plt.subplots()
-    ax.imshow(wc, interpolation='bilinear')
-    ax.axis('off')
-    st.pyplot(fig)
+    wc = WordCloud(width=2000, height=1200, background_color='#F7F9FA', collocations=False).generate_from_frequencies(freqs)
+    buf = io.BytesIO()
+    wc.to_image().save(buf, format='PNG')
+    return buf.getvalue()
+
+
+def draw_headline_wordcloud(df):
+    per_university = headline_frequencies_by_university()
+    freqs = Counter()
+    for uni in df['University'].unique():
+        freqs.update(per_university.get(uni, {}))
+    freqs = merge_plurals(freqs)
+    st.image(headline_wordcloud_png(dict(freqs.most_common(200))))
 
 
-def draw_stress_factor_breakdown(df: pd.DataFrame):
+@st.fragment
+def headline_wordcloud_section(df):
+    st.subheader("Headline Word Cloud")
+    if st.toggle("Show word cloud", key="show_wordcloud"):
+        draw_headline_wordcloud(df)
+
+
+def draw_stress_factor_breakdown(factor_counts: pd.DataFrame):
     required = ['University', 'Primary_Stress_Factor', 'Stress_Level']
-    counts = df.groupby(required).size().reset_index(name='count')
+    counts = (
+        factor_counts.dropna(subset=['University', 'Primary_Stress_Factor'])
+        .astype({c: str for c in required}).fillna({'Stress_Level': 'nan'})
+    )
     level_colors = {'Low': '#FFCCCC', 'Moderate': '#FF6666', 'High': '#CC0000', 'Severe': '#990000'}
     fig = px.treemap(
         counts, path=['University', 'Primary_Stress_Factor', 'Stress_Level'], values='count',
         color='Stress_Level', color_discrete_map=level_colors, title='Stress Factor Breakdown by University'
     )
     grey = '#ECEFF1'
-    new_colors = []
-    for item in fig.data[0]['ids']:
-        parts = item.split('/')
-        if len(parts) == 3:
-            lvl = parts[2]
-            new_colors.append(level_colors.get(lvl, grey))
-        else:
-            new_colors.append(grey)
-    fig.data[0].marker.colors = new_colors
+    trace = fig.data[0]
+    is_leaf = pd.Series(trace.ids).str.count('/') == len(required) - 1
+    trace.marker.colors = pd.Series(trace.labels).map(level_colors).where(is_leaf).fillna(grey).tolist()
     st.plotly_chart(fig)
 
 
 def draw_stress_vs_served(df_stress: pd.DataFrame, df_session: pd.DataFrame):
-    level_map = {'Low': 1, 'Moderate': 2, 'High': 3, 'Severe': 4}
-    df = df_stress[df_stress['Stress_Level'].isin(level_map)].copy()
-    df['Stress_Num'] = df['Stress_Level'].map(level_map)
-    stress_avg = df.groupby('University')['Stress_Num'].mean().reset_index(name='Avg_Stress_Level')
+    levels = df_stress['Stress_Level'].cat.set_categories(STRESS_LEVELS.categories, ordered=True).cat.codes
+    df = df_stress[levels >= 0].copy()
+    df['Stress_Num'] = levels[levels >= 0] + 1
+    stress_avg = df.groupby('University', observed=True)['Stress_Num'].mean().reset_index(name='Avg_Stress_Level')
 
     served_avg = (
-        df_session.groupby(['University', 'Year'])['Students_Served']
+        df_session.groupby(['University', 'Year'], observed=True)['Students_Served']
         .sum().reset_index()
-        .groupby('University')['Students_Served'].mean()
+        .groupby('University', observed=True)['Students_Served'].mean()
         .reset_index(name='Avg_Students_Served_Per_Year')
     )
 
@@ -183,22 +246,23 @@ st.subheader("Mennatallah Gbreel")
 if stress_df.empty or session_df.empty or campaign_df.empty:
     st.info("Please select one or more universities.")
 else:
+    factor_counts = stress_factor_counts(stress_df)
+
     sub1, sub2, sub3 = st.columns(3)
     with sub1:
         gender_dist_pie_chart(stress_df)
     with sub2:
         gender_stress_box_plot(stress_df)
     with sub3:
-        university_students_bar_chart(stress_df)
+        university_students_bar_chart(factor_counts)
 
     col1, col2 = st.columns(2)
     with col1:
-        stress_factors_stacked_bar_chart(stress_df)
+        stress_factors_stacked_bar_chart(factor_counts)
 
     with col2:
         sessions_held_area_chart(session_df)
 
-    draw_stress_factor_breakdown(stress_df)
+    draw_stress_factor_breakdown(factor_counts)
 
-    st.subheader("Headline Word Cloud")
-    draw_headline_wordcloud(campaign_df)
+    headline_wordcloud_section(campaign_df)